@@ -1,17 +1,191 @@
 import streamlit as st
-import pytesseract
 from PIL import Image
 import pandas as pd
+import hashlib
+import heapq
+import importlib.util
+import os
 import re
+import tempfile
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from io import BytesIO
 from datetime import datetime
 
-# PDF処理の安全なインポート
-try:
-    import fitz  # PyMuPDF
-    PDF_SUPPORT = True
-except ImportError:
-    PDF_SUPPORT = False
+# PDF処理の利用可否
+# 読み込みに時間がかかるため、ここでは有無だけを確認し、実際の import は使用時に行う
+PDF_SUPPORT = importlib.util.find_spec('fitz') is not None  # PyMuPDF
+
+# PyMuPDF はスレッドセーフではないため、ドキュメントの読み込み・テキスト抽出・画像化は
+# このロックを取得して1スレッドずつ行う（OCRはロックの外で並列に実行する）
+PDF_LOCK = threading.Lock()
+
+# ファイル単位で並列にOCRするため、Tesseract内部のOpenMPスレッドは1本に抑える
+# （Tesseractの起動前に設定する。明示的な設定があればそれを優先）
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+# スキャンPDFをOCRする際のレンダリング解像度
+PDF_OCR_DPI = 150
+
+# スキャンPDFで一度に画像化・OCRするページ数の上限（画像はこの単位でしか保持しない）
+PDF_OCR_BATCH_PAGES = 40
+
+# OCRに失敗したページの代わりに入れるテキスト
+OCR_SKIPPED_TEXT = "OCR処理をスキップしました"
+
+# Tesseractの追加設定（白黒反転した行の再認識を行わない。入力は白地に黒文字）
+TESSERACT_CONFIG = '-c tessedit_do_invert=0'
+
+# ファイル並列処理の最大スレッド数（OCR/レンダリングのメモリ使用量を抑えるため上限を設ける）
+MAX_WORKERS = 8
+
+# OCRに渡す画像の長辺の上限（これを超える画像は縮小）
+IMAGE_OCR_MAX_SIDE = 2400
+
+# 複数人物用の表解析パターン（モジュール読み込み時にコンパイル）
+# 各パターンはマッチに必須の文字（いずれか1つ）と組にしておき、
+# テキストに含まれない場合は走査自体を省略する
+TABLE_PATTERN_GROUPS = tuple(
+    (pattern_type, tuple((re.compile(pattern, re.DOTALL | re.IGNORECASE), required_chars)
+                         for pattern, required_chars in patterns))
+    for pattern_type, patterns in [
+        # パターン1: 表形式（横並び）の検出
+        ("表形式", [
+            (r'│([^│\n\r]+)│[^│]*?(\d+\.?\d*)[時間hH]*[^│]*?│', '│'),  # │名前│...│時間│
+            (r'([^\|\n\r\t]+)[\|\t]\s*\d+[日]*[\|\t]\s*(\d+\.?\d*)[時間hH]*', '|\t'),  # 名前|日数|時間
+            (r'([^\n\r\t]+)\s+(\d+\.?\d*)[時間hH]+', '時間hH'),  # 名前 時間
+        ]),
+        # パターン2: リスト形式の検出
+        ("リスト形式", [
+            (r'([^\n\r]+?)\s+勤務時間[:\s：]*(\d+\.?\d*)[時間hH]*', '勤'),
+            (r'([^\n\r]+?)[:\s：]+(\d+\.?\d*)[時間hH]+', '時間hH'),
+            (r'([^\n\r]+?)\s+(\d+\.?\d*)[時間hH]+', '時間hH'),
+        ]),
+        # パターン3: 縦並び形式の検出
+        ("縦形式", [
+            (r'氏名[:\s：]*([^\n\r]+).*?勤務時間[:\s：]*(\d+\.?\d*)[時間hH]*', '氏'),
+            (r'社員名[:\s：]*([^\n\r]+).*?勤務時間[:\s：]*(\d+\.?\d*)[時間hH]*', '社'),
+            (r'名前[:\s：]*([^\n\r]+).*?勤務時間[:\s：]*(\d+\.?\d*)[時間hH]*', '名'),
+        ]),
+    ]
+)
+
+# 縦形式パターンの末尾部分（「勤務時間 + 数値」）
+VERTICAL_TAIL_PATTERN = re.compile(r'勤務時間[:\s：]*(\d+\.?\d*)[時間hH]*', re.IGNORECASE)
+
+# 単一人物用の時間キーワード（キーワード, 優先度, 説明）
+HoursKeyword = namedtuple('HoursKeyword', ['keyword', 'priority', 'description'])
+
+# キーワードに続く「区切り + 数値 + 単位」の部分（言語ごとに共通）
+JAPANESE_HOURS_TAIL = r'[:\s：]*(\d+\.?\d*)[時間hH]*'
+ENGLISH_HOURS_TAIL = r'[:\s]*(\d+\.?\d*)[hH時間]*'
+
+# キーワード付きの時間パターン（共通部分 → キーワード表。表の順に照合する）
+HOURS_KEYWORD_TABLES = {
+    JAPANESE_HOURS_TAIL: [
+        # 最優先: 明確に「勤務時間」と書かれたもの
+        HoursKeyword('勤務時間', '最重要', '勤務時間'),
+        HoursKeyword('総勤務時間', '最重要', '総勤務時間'),
+        # 高優先: 合計系
+        HoursKeyword('合計', '高優先', '合計'),
+        HoursKeyword('総時間', '高優先', '総時間'),
+        # 中優先: その他の時間項目
+        HoursKeyword('実働', '中優先', '実働時間'),
+        HoursKeyword('実際', '中優先', '実際時間'),
+    ],
+    ENGLISH_HOURS_TAIL: [
+        HoursKeyword('Total Hours', '最重要', 'Total Hours'),
+        HoursKeyword('Work Hours', '最重要', 'Work Hours'),
+        HoursKeyword('Working Hours', '最重要', 'Working Hours'),
+        HoursKeyword('TOTAL', '高優先', 'TOTAL'),
+        HoursKeyword('Net Hours', '中優先', 'Net Hours'),
+        HoursKeyword('Actual', '中優先', 'Actual'),
+    ],
+}
+
+# キーワードのない数値のみのパターン（上位の優先度で決まらなかった場合に、優先度ごとに走査）
+NUMBER_HOURS_PATTERNS = {
+    # 低優先: 一般的なパターン（日本語 + 英語）
+    '低優先': [
+        (r'(\d+\.?\d+)\s*[時間hH]', '○○時間形式'),
+        (r'(\d+\.?\d+)\s*hours?', '○○hours形式'),
+    ],
+    # 最低優先: 時間:分形式のみ
+    '最低優先': [
+        (r'(\d+)[時:](\d+)[分]?', '時間:分形式'),
+    ],
+}
+PRIORITY_ORDER = ('最重要', '高優先', '中優先', '低優先', '最低優先')
+
+# 優先度ごとの妥当な時間の範囲（合計系は月間の合計時間、時間:分形式は1日分）
+HOURS_RANGES = {
+    '最重要': (50, 500),
+    '高優先': (50, 500),
+    '中優先': (1, 500),
+    '低優先': (1, 500),
+    '最低優先': (1, 24),
+}
+
+def compile_hours_keyword_pattern():
+    """キーワード表を「(キーワード1|キーワード2|...)共通部分」の選択パターンに結合（テキスト走査を1回にする）"""
+    alternatives = []
+    # グループ番号-1 → (キーワード, 共通部分)。共通部分の値グループ（各1つ）は None
+    group_keywords = []
+    for tail, keywords in HOURS_KEYWORD_TABLES.items():
+        keyword_alternation = "|".join(f"({re.escape(entry.keyword)})" for entry in keywords)
+        alternatives.append(f"(?:{keyword_alternation}){tail}")
+        group_keywords += [(entry, tail) for entry in keywords] + [None]
+    return re.compile("|".join(alternatives), re.IGNORECASE), tuple(group_keywords)
+
+HOURS_KEYWORD_PATTERN, HOURS_KEYWORD_GROUPS = compile_hours_keyword_pattern()
+
+# 集計・デバッグ出力の順序（優先度順。同じ優先度内は表の順）
+HOURS_KEYWORD_ORDER = tuple(sorted(
+    (item for item in HOURS_KEYWORD_GROUPS if item is not None),
+    key=lambda item: PRIORITY_ORDER.index(item[0].priority)
+))
+
+# 数値のみのパターン（優先度 → (コンパイル済み, 元パターン, 説明) の一覧）
+NUMBER_HOURS_SCANS = {
+    priority: tuple((re.compile(pattern, re.IGNORECASE), pattern, description) for pattern, description in patterns)
+    for priority, patterns in NUMBER_HOURS_PATTERNS.items()
+}
+
+# 社員名抽出パターン（優先順に評価。各パターンの最初の一致のみ採用）
+# (ラベル, パターン) の組で保持し、ラベルを含まないテキストでは検索しない
+NAME_PATTERNS = tuple((label, re.compile(pattern)) for label, pattern in [
+    # 日本語パターン
+    ('氏名', r'氏名[:\s：]*([^\s\n\r]+)'),
+    ('名前', r'名前[:\s：]*([^\s\n\r]+)'),
+    ('社員名', r'社員名[:\s：]*([^\s\n\r]+)'),
+    ('派遣者', r'派遣者[:\s：]*([^\s\n\r]+)'),
+    ('作業者', r'作業者[:\s：]*([^\s\n\r]+)'),
+
+    # 英語パターン
+    ('Name', r'Name[:\s]*([A-Za-z]+(?:\s+[A-Za-z]+)?)'),  # Name: Suzuki Hanako
+    ('Employee', r'Employee[:\s]*([A-Za-z]+(?:\s+[A-Za-z]+)?)'), # Employee: John Smith
+    ('Worker', r'Worker[:\s]*([A-Za-z]+(?:\s+[A-Za-z]+)?)'),   # Worker: Jane Doe
+
+    # より柔軟なパターン
+    ('氏名', r'氏名\s*[:\s：]\s*([^\s\n\r]+)'),
+    ('名前', r'名前\s*[:\s：]\s*([^\s\n\r]+)'),
+])
+NAME_TRAILING_PATTERN = re.compile(r'[:\s\n\r]+$')
+
+# 社員名のクリーニング・妥当性チェック用パターン
+WHITESPACE_PATTERN = re.compile(r'\s+')
+# 表の区切り文字は空白に置き換える（\t\n\r は元々空白として扱われる）
+NAME_SEPARATOR_TABLE = str.maketrans({'│': ' ', '|': ' '})
+# 前後から除去する記号と空白（\s に該当する文字は U+3000 以下に収まる）
+NAME_EDGE_CHARS = ':：-=' + ''.join(filter(WHITESPACE_PATTERN.fullmatch, map(chr, range(0x3001))))
+NAME_DATE_PATTERN = re.compile(r'\d+[日月年]')
+# 項目名と空白の除去（日付の除去後に行う）
+NAME_ITEM_WORD_PATTERN = re.compile(r'勤務|時間|合計|実績|\s+')
+JAPANESE_NAME_PATTERN = re.compile(r'^[あ-んア-ン一-龯\s]+$')
+ENGLISH_NAME_PATTERN = re.compile(r'^[A-Za-z\s]+$')
+# 社員名として扱わない項目名
+NAME_BLACKLIST = frozenset(['項目', '氏名', '社員名', '名前', '時間', '勤務', '合計', '実績', '承認', '社員', '勤務日数'])
 
 # ページ設定
 st.set_page_config(
@@ -20,44 +194,134 @@ st.set_page_config(
     layout="wide"
 )
 
+# 詳細表示で表示する抽出テキストの最大文字数
+TEXT_PREVIEW_LENGTH = 500
+
+# 結果テーブルの列
+RESULT_COLUMNS = ['ファイル名', '社員名', '勤務時間', '処理方式', '処理日時']
+
 # セッション状態の初期化
 if 'processed_files' not in st.session_state:
     st.session_state.processed_files = []
+if 'results_df' not in st.session_state:
+    st.session_state.results_df = pd.DataFrame(columns=RESULT_COLUMNS)
+# 処理統計（ファイル処理時に加算し、再実行のたびに集計し直さない）
+if 'total_people' not in st.session_state:
+    st.session_state.total_people = 0
+if 'total_hours' not in st.session_state:
+    st.session_state.total_hours = 0.0
 
-def extract_text_from_image(image_file):
-    """画像ファイルからテキストを抽出"""
+def preprocess_image_for_ocr(image):
+    """OCR前処理: グレースケール化・縮小（二値化はTesseract側で行う）"""
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # 透過部分は白背景として扱う
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, image)
+    elif image.mode.startswith('I') or image.mode == 'F':
+        # 16ビット/32ビット画像はそのまま変換すると255で飽和するため、8ビットの範囲に縮める
+        if image.mode.startswith('I;16'):
+            image = image.convert('I')
+        image = image.point(lambda value: value / 256)
+    gray = image.convert('L')
+    # Tesseractの処理時間は画素数に比例するため、大きすぎる画像は縮小
+    if max(gray.size) > IMAGE_OCR_MAX_SIDE:
+        gray.thumbnail((IMAGE_OCR_MAX_SIDE, IMAGE_OCR_MAX_SIDE), Image.LANCZOS)
+    return gray
+
+def ocr_image(image):
+    """画像1枚をOCR"""
+    import pytesseract
+    return pytesseract.image_to_string(image, lang='jpn', config=TESSERACT_CONFIG)
+
+def extract_text_from_image(image_bytes):
+    """画像ファイルの内容からテキストを抽出"""
     try:
-        image = Image.open(image_file)
-        text = pytesseract.image_to_string(image, lang='jpn')
+        image = Image.open(BytesIO(image_bytes))
+        # JPEGはデコード時にグレースケール・縮小してから読み込む（他形式では何もしない）
+        ratio = min(1.0, IMAGE_OCR_MAX_SIDE / max(image.size))
+        image.draft('L', (int(image.width * ratio), int(image.height * ratio)))
+        image.load()
+        text = ocr_image(preprocess_image_for_ocr(image))
         return text, None
     except Exception as e:
         return "", f"画像処理エラー: {str(e)}"
 
-def extract_text_from_pdf(pdf_file):
-    """PDFファイルからテキストを抽出"""
+def ocr_images_batch(images):
+    """複数画像を1回のTesseract呼び出しでOCR（マルチページTIFF経由）"""
+    if len(images) == 1:
+        return [ocr_image(images[0])]
+    
+    import pytesseract
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        tiff_path = os.path.join(tmp_dir, 'pages.tif')
+        images[0].save(tiff_path, format='TIFF', save_all=True, append_images=images[1:])
+        output = pytesseract.image_to_string(tiff_path, lang='jpn', config=TESSERACT_CONFIG)
+    
+    # Tesseractはページごとに改ページ文字(\f)を出力する
+    page_texts = output.split('\f')[:len(images)]
+    page_texts += [""] * (len(images) - len(page_texts))
+    return page_texts
+
+def render_page_for_ocr(page):
+    """PDFページをOCR用のグレースケール画像に変換"""
+    import fitz  # PyMuPDF
+    # PNGへのエンコード/デコードを挟まず、グレースケールの画素バッファから直接画像化
+    # 大判ページでも長辺が IMAGE_OCR_MAX_SIDE を超えないよう解像度を下げる
+    dpi = min(PDF_OCR_DPI, int(IMAGE_OCR_MAX_SIDE * 72 / max(page.rect.width, page.rect.height)))
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False)
+    # samples（bytes）をコピーせずにそのまま画像のバッファとして共有
+    return Image.frombuffer("L", (pix.width, pix.height), pix.samples, "raw", "L", pix.stride, 1)
+
+def extract_text_from_pdf(pdf_bytes):
+    """PDFファイルの内容からテキストを抽出"""
     if not PDF_SUPPORT:
         return "", "PDF処理機能が利用できません"
     
     try:
-        pdf_document = fitz.open(stream=pdf_file.read(), filetype="pdf")
-        text = ""
+        # 読み込みに失敗した場合（壊れた・別物の fitz パッケージ等）もこのファイルのエラーとして扱う
+        import fitz  # PyMuPDF
         
-        for page_num in range(pdf_document.page_count):
-            page = pdf_document[page_num]
-            page_text = page.get_text()
+        with PDF_LOCK:
+            # bytes はそのままMuPDFに渡される（複製しない）
+            pdf_document = fitz.open(stream=pdf_bytes, filetype="pdf")
+        try:
+            with PDF_LOCK:
+                # ブロック単位で1回だけ解析し、判定と本文の両方に使う
+                page_texts = [
+                    "".join(block[4] for block in page.get_text("blocks", sort=False))
+                    for page in pdf_document
+                ]
             
-            if len(page_text.strip()) < 50:
+            # テキストがほとんどないページはOCRの対象
+            ocr_page_nums = [page_num for page_num, page_text in enumerate(page_texts) if len(page_text.strip()) < 50]
+            
+            # PDF_OCR_BATCH_PAGES ページずつ画像化し、1回のTesseract呼び出しでまとめてOCR
+            # （前の組の画像は次の組を画像化する前に解放する）
+            for start in range(0, len(ocr_page_nums), PDF_OCR_BATCH_PAGES):
+                ocr_pages = []  # (ページ番号, 画像)
+                with PDF_LOCK:
+                    for page_num in ocr_page_nums[start:start + PDF_OCR_BATCH_PAGES]:
+                        try:
+                            ocr_pages.append((page_num, render_page_for_ocr(pdf_document[page_num])))
+                        except Exception:
+                            page_texts[page_num] = OCR_SKIPPED_TEXT
+                if not ocr_pages:
+                    continue
+                
                 try:
-                    pix = page.get_pixmap()
-                    img_data = pix.tobytes("png")
-                    image = Image.open(BytesIO(img_data))
-                    page_text = pytesseract.image_to_string(image, lang='jpn')
+                    ocr_texts = ocr_images_batch([image for _, image in ocr_pages])
                 except Exception:
-                    page_text = "OCR処理をスキップしました"
-            
-            text += page_text + "\n"
+                    ocr_texts = [OCR_SKIPPED_TEXT] * len(ocr_pages)
+                for (page_num, _), ocr_text in zip(ocr_pages, ocr_texts):
+                    page_texts[page_num] = ocr_text
+        finally:
+            # ドキュメントは例外時も含めて閉じる
+            with PDF_LOCK:
+                pdf_document.close()
         
-        pdf_document.close()
+        # ページごとに改行で区切って1回で連結
+        text = "".join(page_text + "\n" for page_text in page_texts)
         return text, None
     except Exception as e:
         return "", f"PDFエラー: {str(e)}"
@@ -69,60 +333,42 @@ def extract_multiple_employees_from_table(text):
     
     debug_info.append(f"表形式解析開始: {text[:200]}...")
     
-    # パターン1: 表形式（横並び）の検出
-    table_patterns = [
-        r'│([^│\n\r]+)│[^│]*?(\d+\.?\d*)[時間hH]*[^│]*?│',  # │名前│...│時間│
-        r'([^\|\n\r\t]+)[\|\t]\s*\d+[日]*[\|\t]\s*(\d+\.?\d*)[時間hH]*',  # 名前|日数|時間
-        r'([^\n\r\t]+)\s+(\d+\.?\d*)[時間hH]+',  # 名前 時間
-    ]
-    
-    # パターン2: リスト形式の検出
-    list_patterns = [
-        r'([^\n\r]+?)\s+勤務時間[:\s：]*(\d+\.?\d*)[時間hH]*',
-        r'([^\n\r]+?)[:\s：]+(\d+\.?\d*)[時間hH]+',
-        r'([^\n\r]+?)\s+(\d+\.?\d*)[時間hH]+',
-    ]
-    
-    # パターン3: 縦並び形式の検出  
-    vertical_patterns = [
-        r'氏名[:\s：]*([^\n\r]+).*?勤務時間[:\s：]*(\d+\.?\d*)[時間hH]*',
-        r'社員名[:\s：]*([^\n\r]+).*?勤務時間[:\s：]*(\d+\.?\d*)[時間hH]*',
-        r'名前[:\s：]*([^\n\r]+).*?勤務時間[:\s：]*(\d+\.?\d*)[時間hH]*',
-    ]
-    
-    all_patterns = [
-        ("表形式", table_patterns),
-        ("リスト形式", list_patterns),
-        ("縦形式", vertical_patterns)
-    ]
+    # 縦形式のマッチは必ず「勤務時間 + 数値」で終わるため、その最後の出現より後ろは走査しない
+    # （該当のない氏名の後で .*? が文末までの走査と後戻りを繰り返すのを防ぐ）
+    vertical_end = max((m.end() for m in VERTICAL_TAIL_PATTERN.finditer(text)), default=0)
     
-    for pattern_type, patterns in all_patterns:
-        for i, pattern in enumerate(patterns):
+    for pattern_type, patterns in TABLE_PATTERN_GROUPS:
+        target_text = text[:vertical_end] if pattern_type == "縦形式" else text
+        for i, (pattern, required_chars) in enumerate(patterns):
+            if not any(char in target_text for char in required_chars):
+                continue
             try:
-                matches = re.findall(pattern, text, re.DOTALL | re.IGNORECASE)
-                if matches:
-                    debug_info.append(f"[{pattern_type}] パターン{i+1}でマッチ: {len(matches)}件")
+                # マッチ一覧をリスト化せず、1件ずつ処理する
+                header_index = len(debug_info)
+                match_count = 0
+                for match in pattern.finditer(target_text):
+                    match_count += 1
+                    name_candidate = match.group(1).strip()
+                    hours_candidate = match.group(2).strip()
                     
-                    for match in matches:
-                        if isinstance(match, tuple) and len(match) == 2:
-                            name_candidate = match[0].strip()
-                            hours_candidate = match[1].strip()
-                            
-                            # 名前のクリーニング
-                            name_candidate = clean_employee_name(name_candidate)
-                            if is_valid_employee_name(name_candidate):
-                                try:
-                                    hours = float(hours_candidate)
-                                    if 10 <= hours <= 500:  # 妥当な勤務時間範囲
-                                        employees_data.append({
-                                            'name': name_candidate,
-                                            'hours': hours,
-                                            'pattern_type': pattern_type,
-                                            'pattern_index': i+1
-                                        })
-                                        debug_info.append(f"追加: {name_candidate} -> {hours}時間")
-                                except ValueError:
-                                    continue
+                    # 名前のクリーニング
+                    name_candidate = clean_employee_name(name_candidate)
+                    if is_valid_employee_name(name_candidate):
+                        try:
+                            hours = float(hours_candidate)
+                            if 10 <= hours <= 500:  # 妥当な勤務時間範囲
+                                employees_data.append({
+                                    'name': name_candidate,
+                                    'hours': hours,
+                                    'pattern_type': pattern_type,
+                                    'pattern_index': i+1
+                                })
+                                debug_info.append(f"追加: {name_candidate} -> {hours}時間")
+                        except ValueError:
+                            continue
+                
+                if match_count:
+                    debug_info.insert(header_index, f"[{pattern_type}] パターン{i+1}でマッチ: {match_count}件")
             except Exception as e:
                 debug_info.append(f"[{pattern_type}] パターン{i+1}でエラー: {str(e)}")
                 continue
@@ -136,14 +382,12 @@ def extract_multiple_employees_from_table(text):
 def clean_employee_name(name):
     """社員名のクリーニング"""
     # 不要な文字・記号を除去
-    name = re.sub(r'[│\|\t\n\r]+', ' ', name)  # 表の区切り文字等
-    name = re.sub(r'^[:\s：\-\=]+', '', name)   # 先頭の記号
-    name = re.sub(r'[:\s：\-\=]+$', '', name)   # 末尾の記号
-    name = re.sub(r'\d+[日月年]', '', name)     # 日付
-    name = re.sub(r'勤務|時間|合計|実績', '', name)  # 項目名
-    name = re.sub(r'\s+', '', name)  # 複数の空白を除去
+    name = name.translate(NAME_SEPARATOR_TABLE)  # 表の区切り文字等
+    name = name.strip(NAME_EDGE_CHARS)   # 前後の記号
+    name = NAME_DATE_PATTERN.sub('', name)     # 日付
+    name = NAME_ITEM_WORD_PATTERN.sub('', name)  # 項目名と空白
     
-    return name.strip()
+    return name
 
 def is_valid_employee_name(name):
     """社員名の妥当性チェック"""
@@ -151,244 +395,269 @@ def is_valid_employee_name(name):
         return False
     if len(name) > 20:  # 長すぎる
         return False
-    if re.match(r'^\d+$', name):  # 数字のみ
+    if name.isdecimal():  # 数字のみ（数字を含む名前は下の文字種チェックで除外される）
         return False
-    if name in ['項目', '氏名', '社員名', '名前', '時間', '勤務', '合計', '実績', '承認', '社員', '勤務日数']:
+    if name in NAME_BLACKLIST:
         return False
     
     # 日本語名前の基本パターン
-    if re.match(r'^[あ-んア-ン一-龯\s]+$', name):  # ひらがな・カタカナ・漢字
+    if JAPANESE_NAME_PATTERN.match(name):  # ひらがな・カタカナ・漢字
         return True
-    if re.match(r'^[A-Za-z\s]+$', name):  # 英語名
+    if ENGLISH_NAME_PATTERN.match(name):  # 英語名
         return True
     
     return False
 
 def remove_duplicate_employees(employees_data):
     """重複する社員データを除去"""
-    seen_names = {}
+    seen_names = {}  # 名前 → unique_employees 内の位置
     unique_employees = []
     
     for emp in employees_data:
         name = emp['name']
         if name not in seen_names:
-            seen_names[name] = emp
+            seen_names[name] = len(unique_employees)
             unique_employees.append(emp)
         else:
-            # 既存のデータと比較
-            existing = seen_names[name]
-            if emp['pattern_type'] == '表形式' and existing['pattern_type'] != '表形式':
-                seen_names[name] = emp
-                for i, existing_emp in enumerate(unique_employees):
-                    if existing_emp['name'] == name:
-                        unique_employees[i] = emp
-                        break
+            # 既存のデータと比較し、表形式を優先してその場で置き換える
+            index = seen_names[name]
+            if emp['pattern_type'] == '表形式' and unique_employees[index]['pattern_type'] != '表形式':
+                unique_employees[index] = emp
     
     return unique_employees
 
-def extract_work_hours_smart(text):
-    """単一人物用のスマート時間抽出（英語対応済み）"""
-    debug_info = []
-    all_matches = {}
-    
-    # 英語対応を追加した優先順位付きパターン
-    priority_patterns = [
-        # 最優先: 明確に「勤務時間」と書かれたもの（日本語 + 英語）
-        ('最重要', r'勤務時間[:\s：]*(\d+\.?\d*)[時間hH]*', '勤務時間'),
-        ('最重要', r'総勤務時間[:\s：]*(\d+\.?\d*)[時間hH]*', '総勤務時間'),
-        ('最重要', r'Total Hours[:\s]*(\d+\.?\d*)[hH時間]*', 'Total Hours'),
-        ('最重要', r'Work Hours[:\s]*(\d+\.?\d*)[hH時間]*', 'Work Hours'),
-        ('最重要', r'Working Hours[:\s]*(\d+\.?\d*)[hH時間]*', 'Working Hours'),
-        
-        # 高優先: 合計系（日本語 + 英語）
-        ('高優先', r'合計[:\s：]*(\d+\.?\d*)[時間hH]*', '合計'),
-        ('高優先', r'総時間[:\s：]*(\d+\.?\d*)[時間hH]*', '総時間'),
-        ('高優先', r'TOTAL[:\s]*(\d+\.?\d*)[hH時間]*', 'TOTAL'),
-        ('高優先', r'Total[:\s]*(\d+\.?\d*)[hH時間]*', 'Total'),
-        
-        # 中優先: その他の時間項目（日本語 + 英語）
-        ('中優先', r'実働[:\s：]*(\d+\.?\d*)[時間hH]*', '実働時間'),
-        ('中優先', r'実際[:\s：]*(\d+\.?\d*)[時間hH]*', '実際時間'),
-        ('中優先', r'Net Hours[:\s]*(\d+\.?\d*)[hH時間]*', 'Net Hours'),
-        ('中優先', r'Actual[:\s]*(\d+\.?\d*)[hH時間]*', 'Actual'),
-        
-        # 低優先: 一般的なパターン（日本語 + 英語）
-        ('低優先', r'(\d+\.?\d+)\s*[時間hH]', '○○時間形式'),
-        ('低優先', r'(\d+\.?\d+)\s*hours?', '○○hours形式'),
-        
-        # 最低優先: 時間:分形式のみ
-        ('最低優先', r'(\d+)[時:](\d+)[分]?', '時間:分形式'),
-    ]
-    
-    debug_info.append(f"抽出対象テキスト（最初の300文字）: {text[:300]}...")
-    
-    for priority, pattern, description in priority_patterns:
+def to_valid_hours(priority, match):
+    """マッチ結果を時間に変換（優先度ごとの妥当範囲外ならNone）"""
+    if isinstance(match, tuple):
+        hours = float(match[0]) + float(match[1]) / 60  # 時間:分形式
+    else:
+        hours = float(match)
+    low, high = HOURS_RANGES[priority]
+    return round(hours, 2) if low <= hours <= high else None
+
+def add_valid_hours(values, priority, description, match):
+    """妥当な時間であれば値の一覧（値 → 説明。出現順を保って重複除去）に追加"""
+    try:
+        value = to_valid_hours(priority, match)
+    except ValueError:
+        return
+    if value is not None and value not in values:
+        values[value] = description
+
+def scan_keyword_hours(text, debug_info):
+    """キーワード付きパターンで1回走査し、優先度ごとの妥当な値を収集"""
+    matches_by_keyword = {}  # (キーワード, 共通部分) → 一致した値の一覧
+    try:
+        for found in HOURS_KEYWORD_PATTERN.finditer(text):
+            # 最初に一致したグループ（キーワード）から表の項目を、最後のグループから値を取得
+            keyword = next(HOURS_KEYWORD_GROUPS[index] for index, group in enumerate(found.groups()) if group is not None)
+            matches_by_keyword.setdefault(keyword, []).append(found.group(found.lastindex))
+    except Exception as e:
+        debug_info.append(f"[キーワード] パターンエラー: {str(e)}")
+    
+    # デバッグ情報はキーワードごとに1行にまとめ、値は優先度順・表の順に集計する
+    values_by_priority = {entry.priority: {} for entry, _ in HOURS_KEYWORD_ORDER}
+    for entry, tail in HOURS_KEYWORD_ORDER:
+        matches = matches_by_keyword.get((entry, tail))
+        if matches:
+            debug_info.append(f"[{entry.priority}] {entry.description} '{entry.keyword}{tail}' → {matches}")
+            for match in matches:
+                add_valid_hours(values_by_priority[entry.priority], entry.priority, entry.description, match)
+    return values_by_priority
+
+def scan_number_hours(text, priority, debug_info):
+    """数値のみのパターンで走査し、その優先度の妥当な値を収集"""
+    values = {}
+    for compiled, pattern, description in NUMBER_HOURS_SCANS[priority]:
         try:
-            matches = re.findall(pattern, text, re.IGNORECASE)
+            matches = compiled.findall(text)
             if matches:
                 debug_info.append(f"[{priority}] {description} '{pattern}' → {matches}")
-                
                 for match in matches:
-                    try:
-                        if isinstance(match, tuple) and len(match) == 2:
-                            hours = float(match[0]) + float(match[1]) / 60
-                            if 1 <= hours <= 24:
-                                if priority not in all_matches:
-                                    all_matches[priority] = []
-                                all_matches[priority].append({
-                                    'value': round(hours, 2),
-                                    'description': f"{description}({match[0]}:{match[1]})",
-                                    'pattern': pattern
-                                })
-                        else:
-                            hours = float(match)
-                            if priority == '最重要' and 50 <= hours <= 500:
-                                if priority not in all_matches:
-                                    all_matches[priority] = []
-                                all_matches[priority].append({
-                                    'value': round(hours, 2),
-                                    'description': description,
-                                    'pattern': pattern
-                                })
-                            elif priority == '高優先' and 50 <= hours <= 500:
-                                if priority not in all_matches:
-                                    all_matches[priority] = []
-                                all_matches[priority].append({
-                                    'value': round(hours, 2),
-                                    'description': description,
-                                    'pattern': pattern
-                                })
-                            elif priority in ['中優先', '低優先'] and 1 <= hours <= 500:
-                                if priority not in all_matches:
-                                    all_matches[priority] = []
-                                all_matches[priority].append({
-                                    'value': round(hours, 2),
-                                    'description': description,
-                                    'pattern': pattern
-                                })
-                    except ValueError:
-                        continue
+                    add_valid_hours(values, priority, description, match)
         except Exception as e:
             debug_info.append(f"[{priority}] パターンエラー: {str(e)}")
-            continue
+    return values
+
+def extract_work_hours_smart(text):
+    """単一人物用のスマート時間抽出（英語対応済み）"""
+    debug_info = []
+    selected_values = set()
     
-    # 優先順位に基づいて最適な値を選択
-    selected_values = []
+    debug_info.append(f"抽出対象テキスト（最初の300文字）: {text[:300]}...")
     
-    for priority in ['最重要', '高優先', '中優先', '低優先', '最低優先']:
-        if priority in all_matches:
-            unique_values = []
-            seen_values = set()
-            
-            for item in all_matches[priority]:
-                if item['value'] not in seen_values:
-                    unique_values.append(item)
-                    seen_values.add(item['value'])
+    # キーワード付きの優先度は1回の走査でまとめて収集し、優先順位の高い順に判定する
+    # 十分なデータが見つかった時点で、以降の数値のみのパターンは走査しない
+    values_by_priority = scan_keyword_hours(text, debug_info)  # 優先度 → {値: 説明}
+    for priority in PRIORITY_ORDER:
+        if priority not in values_by_priority:
+            values_by_priority[priority] = scan_number_hours(text, priority, debug_info)
+        level_values = values_by_priority[priority]
+        
+        if level_values:
+            debug_info.append(f"[{priority}] 採用: {list(level_values)}")
+            selected_values.update(level_values)
             
-            if unique_values:
-                debug_info.append(f"[{priority}] 採用: {[item['value'] for item in unique_values]}")
-                selected_values.extend([item['value'] for item in unique_values])
-                
-                if priority in ['最重要', '高優先'] and len(unique_values) >= 1:
-                    debug_info.append(f"[決定] {priority}レベルで十分なデータが見つかったため、以下の優先度は無視")
-                    break
+            if priority in ['最重要', '高優先']:
+                debug_info.append(f"[決定] {priority}レベルで十分なデータが見つかったため、以下の優先度は走査しない")
+                break
     
-    final_results = sorted(list(set(selected_values)))
-    
-    if len(final_results) > 3:
-        final_results = final_results[-2:]
+    if len(selected_values) > 3:
+        # 全件を並べ替えず、上位2件だけを取り出す
+        final_results = sorted(heapq.nlargest(2, selected_values))
         debug_info.append(f"結果を絞り込み: 最大値付近を採用")
+    else:
+        final_results = sorted(selected_values)
     
     debug_info.append(f"最終選択結果: {final_results}")
     
-    # デバッグ情報をセッション状態に保存
-    if 'debug_info' not in st.session_state:
-        st.session_state.debug_info = {}
-    st.session_state.debug_info[text[:50]] = debug_info
-    
-    return final_results
+    return final_results, debug_info
 
 def extract_employee_name(text):
     """英語対応強化版 - 社員名抽出"""
-    name_patterns = [
-        # 日本語パターン
-        r'氏名[:\s：]*([^\s\n\r]+)',
-        r'名前[:\s：]*([^\s\n\r]+)',
-        r'社員名[:\s：]*([^\s\n\r]+)',
-        r'派遣者[:\s：]*([^\s\n\r]+)',
-        r'作業者[:\s：]*([^\s\n\r]+)',
-        
-        # 英語パターン
-        r'Name[:\s]*([A-Za-z]+(?:\s+[A-Za-z]+)?)',  # Name: Suzuki Hanako
-        r'Employee[:\s]*([A-Za-z]+(?:\s+[A-Za-z]+)?)', # Employee: John Smith
-        r'Worker[:\s]*([A-Za-z]+(?:\s+[A-Za-z]+)?)',   # Worker: Jane Doe
-        
-        # より柔軟なパターン
-        r'氏名\s*[:\s：]\s*([^\s\n\r]+)',
-        r'名前\s*[:\s：]\s*([^\s\n\r]+)',
-    ]
-    
-    for pattern in name_patterns:
-        match = re.search(pattern, text)
+    for label, pattern in NAME_PATTERNS:
+        if label not in text:
+            continue
+        match = pattern.search(text)
         if match:
             name = match.group(1).strip()
-            name = re.sub(r'[:\s\n\r]+$', '', name)  # 末尾の記号除去
+            name = NAME_TRAILING_PATTERN.sub('', name)  # 末尾の記号除去
             if len(name) > 1 and not name.isdigit():
                 return name
     
     return "不明"
 
-def process_file_multi_person(uploaded_file):
-    """複数人対応版のファイル処理"""
-    file_extension = uploaded_file.name.split('.')[-1].lower()
-    
-    if file_extension in ['png', 'jpg', 'jpeg', 'bmp', 'tiff']:
-        text, error = extract_text_from_image(uploaded_file)
-    elif file_extension == 'pdf':
-        text, error = extract_text_from_pdf(uploaded_file)
-    else:
-        return None, "サポートされていないファイル形式です"
-    
+# 拡張子 → テキスト抽出関数（ファイル内容の bytes を受け取る）
+TEXT_EXTRACTORS = {extension: extract_text_from_image for extension in ('png', 'jpg', 'jpeg', 'bmp', 'tiff')}
+TEXT_EXTRACTORS['pdf'] = extract_text_from_pdf
+
+class UncachedResult(Exception):
+    """キャッシュに保存しない処理結果（エラー、またはOCRに失敗したページを含む結果）"""
+    def __init__(self, result, error):
+        super().__init__(error)
+        self.result = result
+        self.error = error
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def process_file_bytes(content_hash, file_extension, _file_bytes):
+    """ファイル内容から勤務データを抽出（同一内容の再処理時はハッシュでキャッシュを利用）"""
+    # 例外で返した結果はキャッシュされないため、一時的な失敗が同じ内容のファイルに残らない
+    extractor = TEXT_EXTRACTORS.get(file_extension)
+    if extractor is None:
+        raise UncachedResult(None, "サポートされていないファイル形式です")
+    
+    text, error = extractor(_file_bytes)
     if error:
-        return None, error
+        raise UncachedResult(None, error)
+    
+    # 詳細表示用のテキスト抜粋は処理時に1度だけ作成（全文は結果に保持しない）
+    raw_text_preview = text[:TEXT_PREVIEW_LENGTH] + "..." if len(text) > TEXT_PREVIEW_LENGTH else text
     
     # 複数人物として処理を試行
     employees_data, debug_info = extract_multiple_employees_from_table(text)
     
     # 複数人が検出された場合は表形式として処理
     if len(employees_data) > 1:
-        return {
+        result = {
             'type': 'multi_person',
-            'raw_text': text,
+            'raw_text_preview': raw_text_preview,
             'employees': employees_data,
-            'file_name': uploaded_file.name,
-            'processed_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             'debug_info': debug_info
-        }, None
+        }
     else:
         # 単一人物として処理
         single_employee_name = extract_employee_name(text)
-        single_work_hours = extract_work_hours_smart(text)
+        single_work_hours, _ = extract_work_hours_smart(text)
         
-        return {
+        result = {
             'type': 'single_person', 
-            'raw_text': text,
+            'raw_text_preview': raw_text_preview,
             'employee_name': single_employee_name,
-            'work_hours': single_work_hours,
-            'file_name': uploaded_file.name,
-            'processed_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }, None
+            'work_hours': single_work_hours
+        }
+    
+    if OCR_SKIPPED_TEXT in text:
+        raise UncachedResult(result, None)
+    return result, None
+
+def process_file_multi_person(file_name, file_bytes):
+    """複数人対応版のファイル処理（アップロード済みのファイル名と内容を受け取る）"""
+    content_hash = hashlib.sha256(file_bytes).hexdigest()
+    # ファイル名はキャッシュキーに含めない（名前を変えた同一ファイルでもOCRを再実行しない）
+    file_extension = os.path.splitext(file_name)[1][1:].lower()
+    try:
+        result, error = process_file_bytes(content_hash, file_extension, file_bytes)
+    except UncachedResult as uncached:
+        result, error = uncached.result, uncached.error
+    if error:
+        return None, error
+    
+    # ファイル名・処理日時はキャッシュ利用時も今回のアップロードのものにする
+    result['file_name'] = file_name
+    result['processed_at'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return result, None
+
+def file_total_hours(file_data):
+    """1ファイル分の合計勤務時間（単一/複数人物共通）"""
+    if file_data['type'] == 'multi_person':
+        return sum(emp['hours'] for emp in file_data['employees'])
+    return sum(file_data['work_hours'])
+
+def build_result_rows(file_data):
+    """1ファイル分の処理結果を結果テーブルの行（RESULT_COLUMNS順のタプル）に変換"""
+    if file_data['type'] == 'multi_person':
+        return [
+            (file_data['file_name'], emp['name'], f"{emp['hours']:.2f}時間", '表形式', file_data['processed_at'])
+            for emp in file_data['employees']
+        ]
+    
+    total_hours = file_total_hours(file_data)
+    hours_text = f"{total_hours:.2f}時間" if total_hours > 0 else "未検出"
+    return [(file_data['file_name'], file_data['employee_name'], hours_text, '単一人物', file_data['processed_at'])]
+
+def append_results_table(new_files):
+    """結果テーブルに新しく処理したファイル分の行だけを追加"""
+    rows = [row for file_data in new_files for row in build_result_rows(file_data)]
+    # 行の辞書ではなく列ごとのリストから一括で生成する
+    columns = zip(*rows) if rows else [[]] * len(RESULT_COLUMNS)
+    new_df = pd.DataFrame({column: list(values) for column, values in zip(RESULT_COLUMNS, columns)})
+    if st.session_state.results_df.empty:
+        st.session_state.results_df = new_df
+    else:
+        st.session_state.results_df = pd.concat([st.session_state.results_df, new_df], ignore_index=True)
 
 def create_excel_output_multi(df):
     """複数人対応版Excel出力"""
+    output = BytesIO()
     try:
-        import openpyxl
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='勤務時間突合結果', index=False)
+        import xlsxwriter
+    except ImportError:
+        xlsxwriter = None
+    
+    if xlsxwriter is not None:
+        # 行を逐次書き出し、ワークブック全体をメモリ上に保持しない
+        # （pandas経由では列単位で書き込まれ constant_memory と両立しないため直接書き込む）
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+        worksheet = workbook.add_worksheet('勤務時間突合結果')
+        worksheet.write_row(0, 0, list(df.columns))
+        for row_index, row in enumerate(df.itertuples(index=False, name=None), start=1):
+            worksheet.write_row(row_index, 0, row)
+        workbook.close()
         return output.getvalue()
+    
+    try:
+        import openpyxl
     except ImportError:
         return None
+    
+    # 書き込み専用モードで行を順に追加（セルオブジェクトを保持しない）
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet('勤務時間突合結果')
+    worksheet.append(list(df.columns))
+    for row in df.itertuples(index=False, name=None):
+        worksheet.append(row)
+    workbook.save(output)
+    return output.getvalue()
 
 def main():
     # ヘッダー
@@ -434,27 +703,18 @@ def main():
         # データクリアボタン
         if st.button("🗑️ 処理結果をクリア"):
             st.session_state.processed_files = []
+            st.session_state.results_df = pd.DataFrame(columns=RESULT_COLUMNS)
+            st.session_state.total_people = 0
+            st.session_state.total_hours = 0.0
         
         # 統計情報
         if st.session_state.processed_files:
             st.markdown("---")
             st.subheader("📊 処理統計")
             
-            total_files = len(st.session_state.processed_files)
-            total_people = 0
-            total_hours = 0
-            
-            for file_data in st.session_state.processed_files:
-                if file_data['type'] == 'multi_person':
-                    total_people += len(file_data['employees'])
-                    total_hours += sum([emp['hours'] for emp in file_data['employees']])
-                else:
-                    total_people += 1
-                    total_hours += sum(file_data['work_hours']) if file_data['work_hours'] else 0
-            
-            st.metric("処理済みファイル", total_files)
-            st.metric("処理済み人数", total_people)
-            st.metric("合計勤務時間", f"{total_hours:.1f}時間")
+            st.metric("処理済みファイル", len(st.session_state.processed_files))
+            st.metric("処理済み人数", st.session_state.total_people)
+            st.metric("合計勤務時間", f"{st.session_state.total_hours:.1f}時間")
     
     # メインエリア
     if st.session_state.processed_files:
@@ -483,27 +743,50 @@ def process_files_multi(uploaded_files):
     """複数ファイルを処理（複数人対応版）"""
     progress_bar = st.progress(0)
     status_text = st.empty()
-    
-    for i, uploaded_file in enumerate(uploaded_files):
-        status_text.text(f"処理中: {uploaded_file.name} ({i+1}/{len(uploaded_files)})")
-        
-        result, error = process_file_multi_person(uploaded_file)
+    status_text.text(f"処理中: {len(uploaded_files)}ファイル")
+    
+    # OCRはTesseractの外部プロセスで実行されるため、スレッドで並列に処理できる
+    # （PyMuPDFによるPDFの読み込み・画像化は PDF_LOCK により1ファイルずつ実行される）
+    results = [None] * len(uploaded_files)
+    max_workers = min(MAX_WORKERS, os.cpu_count() or 1, len(uploaded_files))
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # UploadedFile はスレッド間で共有せず、内容はメインスレッドで読み出してから渡す
+        futures = {
+            executor.submit(process_file_multi_person, uploaded_file.name, uploaded_file.getvalue()): i
+            for i, uploaded_file in enumerate(uploaded_files)
+        }
         
-        if error:
-            st.error(f"❌ {uploaded_file.name}: {error}")
-        else:
-            st.session_state.processed_files.append(result)
+        for done, future in enumerate(as_completed(futures), start=1):
+            uploaded_file = uploaded_files[futures[future]]
+            status_text.text(f"完了: {uploaded_file.name} ({done}/{len(uploaded_files)})")
+            
+            result, error = future.result()
             
-            if result['type'] == 'multi_person':
-                people_count = len(result['employees'])
-                total_hours = sum([emp['hours'] for emp in result['employees']])
-                st.success(f"✅ {uploaded_file.name}: 表形式処理完了（{people_count}人、合計{total_hours:.1f}時間）")
+            if error:
+                st.error(f"❌ {uploaded_file.name}: {error}")
             else:
-                work_hours_count = len(result['work_hours'])
-                work_hours_total = sum(result['work_hours']) if result['work_hours'] else 0
-                st.success(f"✅ {uploaded_file.name}: 単一人物処理完了（{work_hours_total:.1f}時間）")
-        
-        progress_bar.progress((i + 1) / len(uploaded_files))
+                results[futures[future]] = result
+                
+                total_hours = file_total_hours(result)
+                if result['type'] == 'multi_person':
+                    people_count = len(result['employees'])
+                    st.success(f"✅ {uploaded_file.name}: 表形式処理完了（{people_count}人、合計{total_hours:.1f}時間）")
+                else:
+                    st.success(f"✅ {uploaded_file.name}: 単一人物処理完了（{total_hours:.1f}時間）")
+            
+            progress_bar.progress(done / len(uploaded_files))
+    
+    # セッション状態への書き込みはメインスレッドでアップロード順に行う
+    new_files = [result for result in results if result is not None]
+    for result in new_files:
+        st.session_state.processed_files.append(result)
+        if result['type'] == 'multi_person':
+            st.session_state.total_people += len(result['employees'])
+        else:
+            st.session_state.total_people += 1
+        st.session_state.total_hours += file_total_hours(result)
+    append_results_table(new_files)
     
     status_text.text("🎉 すべての処理が完了しました！")
 
@@ -511,29 +794,8 @@ def display_results_multi():
     """複数人対応版結果表示"""
     st.header("📊 処理結果")
     
-    # 結果テーブル作成
-    data = []
-    for file_data in st.session_state.processed_files:
-        if file_data['type'] == 'multi_person':
-            for emp in file_data['employees']:
-                data.append({
-                    'ファイル名': file_data['file_name'],
-                    '社員名': emp['name'],
-                    '勤務時間': f"{emp['hours']:.2f}時間",
-                    '処理方式': '表形式',
-                    '処理日時': file_data['processed_at']
-                })
-        else:
-            total_hours = sum(file_data['work_hours']) if file_data['work_hours'] else 0
-            data.append({
-                'ファイル名': file_data['file_name'],
-                '社員名': file_data['employee_name'],
-                '勤務時間': f"{total_hours:.2f}時間" if total_hours > 0 else "未検出",
-                '処理方式': '単一人物',
-                '処理日時': file_data['processed_at']
-            })
-    
-    df = pd.DataFrame(data)
+    # 結果テーブルは処理時に追記済みのものを再利用
+    df = st.session_state.results_df
     
     # テーブル表示
     st.dataframe(df, use_container_width=True, hide_index=True)
@@ -560,12 +822,13 @@ def display_results_multi():
                 if file_data['type'] == 'multi_person':
                     st.success(f"表形式処理: {len(file_data['employees'])}人検出")
                     
-                    # 検出された人物一覧
-                    employees_df = pd.DataFrame([
-                        {'社員名': emp['name'], '勤務時間': f"{emp['hours']}時間", 
-                         'パターン': emp['pattern_type']} 
-                        for emp in file_data['employees']
-                    ])
+                    # 検出された人物一覧（列ごとのリストから生成）
+                    employees = file_data['employees']
+                    employees_df = pd.DataFrame({
+                        '社員名': [emp['name'] for emp in employees],
+                        '勤務時間': [f"{emp['hours']}時間" for emp in employees],
+                        'パターン': [emp['pattern_type'] for emp in employees],
+                    })
                     st.dataframe(employees_df, use_container_width=True, hide_index=True)
                     
                     # デバッグ情報
@@ -578,12 +841,12 @@ def display_results_multi():
                     st.write(f"**社員名:** {file_data['employee_name']}")
                     if file_data['work_hours']:
                         st.write(f"**勤務時間:** {file_data['work_hours']}")
-                        st.write(f"**合計:** {sum(file_data['work_hours']):.2f}時間")
+                        st.write(f"**合計:** {file_total_hours(file_data):.2f}時間")
                 
                 # 元テキスト表示
                 st.text_area(
                     "抽出されたテキスト",
-                    file_data['raw_text'][:500] + "..." if len(file_data['raw_text']) > 500 else file_data['raw_text'],
+                    file_data['raw_text_preview'],
                     height=200,
                     key=f"detail_text_multi_{i}_{file_data['file_name']}"
                 )